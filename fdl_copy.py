@@ -1,23 +1,94 @@
 import os
+import io
 import sys
+import codecs
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import pyperclip
 
 # FDL 标记
 FILE_MARKER = "$$FILE"
 
-def is_text_file(filepath):
+# 探测文件类型时读取的字节数
+PROBE_SIZE = 4096
+# 已知的二进制扩展名: 命中时直接判定为非文本, 不必打开文件
+_BINARY_EXTS = frozenset({
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.ico',
+    '.zip', '.gz', '.bz2', '.xz', '.tar', '.7z', '.rar', '.jar',
+    '.pdf', '.mp3', '.mp4', '.mov', '.avi', '.wav', '.flac',
+    '.o', '.a', '.so', '.dll', '.exe', '.class', '.pyc', '.pyo',
+    '.woff', '.woff2', '.ttf', '.otf', '.bin', '.dat', '.db', '.sqlite',
+})
+# 读取文件剩余内容时每次 read 的字节数
+READ_CHUNK_SIZE = 1 << 16
+# 并发探测/读取文件的线程数 (I/O 密集, 可以多于 CPU 核数)
+MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# Windows 下必须以二进制方式打开, 否则 os.read 会做换行转换
+_O_RDONLY_BINARY = os.O_RDONLY | getattr(os, 'O_BINARY', 0)
+
+def _is_utf8_bytes(buf):
     """
-    判断一个文件是否可能为文本文件。
-    尝试用 UTF-8 解码文件的前1024字节，如果成功则认为是文本文件。
+    校验一段字节是否为合法的 UTF-8。
+    含 NUL 字节的内容直接视为二进制，不必进入解码器；
+    读满探测块时使用增量解码 (final=False)，被截断在块末尾的多字节字符不视为错误；
+    不足一个探测块说明已读到文件末尾，此时按完整内容严格校验 (final=True)。
     """
+    if b'\x00' in buf:
+        return False
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            f.read(1024)
+        codecs.utf_8_decode(buf, 'strict', len(buf) < PROBE_SIZE)
         return True
-    except (UnicodeDecodeError, IOError):
+    except UnicodeDecodeError:
         return False
 
+def _iter_files(root):
+    """
+    以显式栈 + os.scandir 遍历目录，逐个产出文件的 DirEntry。
+    文件类型直接取自 readdir 返回的 d_type，无需额外 stat；
+    与 os.walk 一致，不会进入指向目录的符号链接。
+    子目录逆序压栈，出栈顺序即与 os.walk 自顶向下的遍历顺序相同。
+    """
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file():
+                        yield entry
+        except OSError:
+            continue
+        stack.extend(reversed(subdirs))
+
+def _read_text_file(filepath):
+    """
+    如果是文本文件则返回其全部字节，否则返回 None。
+    探测与读取共用同一个文件描述符：探测读出的开头字节直接作为内容的一部分，每个文件只打开一次。
+    供线程池并发调用：open/read 期间会释放 GIL。
+    """
+    if os.path.splitext(filepath)[1].lower() in _BINARY_EXTS:
+        return None
+    try:
+        fd = os.open(filepath, _O_RDONLY_BINARY)
+        try:
+            head = os.read(fd, PROBE_SIZE)
+            if not _is_utf8_bytes(head):
+                return None
+            # 不足一个探测块说明已读到文件末尾，省去后续 read
+            if len(head) < PROBE_SIZE:
+                return head
+            chunks = [head]
+            while chunk := os.read(fd, READ_CHUNK_SIZE):
+                chunks.append(chunk)
+            return b''.join(chunks)
+        finally:
+            os.close(fd)
+    except OSError:
+        return None
+
 def dir_to_fdl(source_dir):
     """
     将目录结构和文本文件内容转换为FDL字符串。
@@ -25,27 +96,35 @@ def dir_to_fdl(source_dir):
     if not os.path.isdir(source_dir):
         raise ValueError(f"错误: 提供的路径 '{source_dir}' 不是一个有效的目录。")
 
-    fdl_parts = []
+    # 直接以字节拼接: 文件内容不经过 解码 -> str -> 再编码 的往返
+    buf = io.BytesIO()
     base_dir = os.path.abspath(source_dir)
+    # 所有条目路径都以 base_dir 开头，直接切片即可得到相对路径，省去 os.path.relpath
+    prefix_len = len(os.path.join(base_dir, ''))
 
-    for dirpath, _, filenames in os.walk(base_dir):
-        for filename in filenames:
-            full_path = os.path.join(dirpath, filename)
-            
+    # 先单线程收集文件列表，再用线程池并发探测和读取，结果按原顺序写入
+    paths = [entry.path for entry in _iter_files(base_dir)]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for full_path, content in zip(paths, executor.map(_read_text_file, paths)):
             # 仅处理文本文件
-            if is_text_file(full_path):
-                # 获取相对于源目录的路径
-                relative_path = os.path.relpath(full_path, base_dir)
-                
-                # 添加文件标记和路径
-                fdl_parts.append(f"{FILE_MARKER} {relative_path.replace(os.sep, '/')}")
-                
-                # 读取并添加文件内容
-                with open(full_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    fdl_parts.append(content)
-
-    return "\n".join(fdl_parts)
+            if content is None:
+                continue
+
+            # 获取相对于源目录的路径
+            relative_path = full_path[prefix_len:]
+
+            # 文件块之间以换行分隔
+            if buf.tell():
+                buf.write(b"\n")
+            # 添加文件标记和路径
+            header = f"{FILE_MARKER} {relative_path.replace(os.sep, '/')}\n"
+            buf.write(header.encode('utf-8', 'surrogateescape'))
+
+            # 添加文件内容
+            buf.write(content)
+
+    # 只在最终交给剪切板时解码一次
+    return buf.getvalue().decode('utf-8', errors='replace')
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="将目录内容编码为FDL并复制到剪切板。")
@@ -18,38 +18,46 @@ def fdl_to_dir(fdl_string, target_dir):
     if not normalized_fdl.strip().startswith(FILE_MARKER):
         raise ValueError("剪切板内容不是有效的FDL格式（未找到 $$FILE 标记）。")
 
-    # 优化解析逻辑：通过在开头添加换行符，让所有文件块的分割方式保持一致。
-    # 这样可以避免对第一个文件块进行特殊处理。
-    if not normalized_fdl.startswith("\n"):
-        # 确保第一个$$FILE前有换行符，以便统一分割
-        temp_fdl = "\n" + normalized_fdl
-    else:
-        temp_fdl = normalized_fdl
-
-    # 按“换行+标记”进行分割，第一个元素会是空字符串，直接忽略。
-    parts = temp_fdl.split(f"\n{FILE_MARKER} ")
-
-    if not os.path.exists(target_dir):
+    # 直接创建目标目录, 已存在时由 FileExistsError 得知, 不必先 exists 多一次 stat;
+    # 不用 exist_ok=True 是为了仍能只在真正新建时给出提示
+    try:
         os.makedirs(target_dir)
         print(f"已创建目标目录: {target_dir}")
+    except FileExistsError:
+        pass
+
+    # 逐个查找“换行+标记”并按需切片，不再 split 出包含全部内容的中间列表。
+    # 开头的标记前没有换行符，单独处理，避免为统一分割而复制整个字符串。
+    marker = f"\n{FILE_MARKER} "
+    if normalized_fdl.startswith(marker[1:]):
+        pos, marker_len = 0, len(marker) - 1
+    else:
+        pos, marker_len = normalized_fdl.find(marker), len(marker)
 
+    # 已确保存在的目录; 同一目录下的多个文件只需创建/检查一次
+    # 以 os.path.dirname 的形式登记目标目录 (去掉末尾分隔符), 与下面父目录的写法一致
+    ensured_dirs = {os.path.dirname(os.path.join(target_dir, ''))}
     created_count = 0
-    # 从第二个元素开始遍历 (parts[0] 是空字符串)
-    for part in parts[1:]:
-        if not part.strip():
-            continue
+    while pos != -1:
+        start = pos + marker_len
+        pos, marker_len = normalized_fdl.find(marker, start), len(marker)
+        end = pos if pos != -1 else len(normalized_fdl)
 
         # 按第一个换行符分割路径和内容。由于已标准化，这里可以安全使用'\n'。
-        try:
-            path_part, content = part.split('\n', 1)
-        except ValueError:  # 如果文件为空，没有换行符
-            path_part = part
+        newline = normalized_fdl.find('\n', start, end)
+        if newline == -1:  # 如果文件为空，没有换行符
+            path_part = normalized_fdl[start:end]
             content = ""
+        else:
+            path_part = normalized_fdl[start:newline]
+            content = normalized_fdl[newline + 1:end]
 
         # 清理路径字符串，防止因空格或制表符导致问题
         relative_path = path_part.strip()
         if not relative_path:
-            print(f"警告：检测到空的相对路径，已跳过。", file=sys.stderr)
+            # 整块都是空白时静默跳过
+            if content.strip():
+                print(f"警告：检测到空的相对路径，已跳过。", file=sys.stderr)
             continue
 
         # 构建完整的目标文件路径
@@ -57,8 +65,9 @@ def fdl_to_dir(fdl_string, target_dir):
 
         # 创建父目录
         parent_dir = os.path.dirname(full_path)
-        if parent_dir and not os.path.exists(parent_dir):
-            os.makedirs(parent_dir)
+        if parent_dir and parent_dir not in ensured_dirs:
+            os.makedirs(parent_dir, exist_ok=True)
+            ensured_dirs.add(parent_dir)
 
         # 写入文件。Python的文本模式('w')默认会使用系统的标准换行符。
         with open(full_path, 'w', encoding='utf-8') as f:
@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fdl_copy
+import tui_fdl_diff
+import tui_fdl_pro
+
+PROBE_MODULES = (fdl_copy, tui_fdl_pro, tui_fdl_diff)
+
+
+class Utf8ProbeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, name, data):
+        path = os.path.join(self.root, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_short_latin1_bytes_are_not_text(self):
+        # 整个文件都在一个探测块内时, 末尾不完整的多字节序列必须判为非 UTF-8
+        for module in PROBE_MODULES:
+            with self.subTest(module=module.__name__):
+                self.assertFalse(module._is_utf8_bytes(b"caf\xe9"))
+
+    def test_multibyte_cut_at_probe_boundary_is_text(self):
+        # 读满探测块时, 被截断在块末尾的多字节字符不算错误
+        for module in PROBE_MODULES:
+            with self.subTest(module=module.__name__):
+                buf = ("a" * (module.PROBE_SIZE - 1) + "中").encode("utf-8")[:module.PROBE_SIZE]
+                self.assertTrue(module._is_utf8_bytes(buf))
+
+    def test_is_encodable_rejects_short_latin1_file(self):
+        path = self._write("latin1.txt", b"caf\xe9")
+        self.assertFalse(tui_fdl_pro.is_encodable(path))
+        self.assertFalse(tui_fdl_diff.is_encodable(path))
+
+    def test_dir_to_fdl_skips_short_latin1_file(self):
+        self._write("latin1.txt", b"caf\xe9")
+        self._write("ok.txt", "café\n".encode("utf-8"))
+        fdl = fdl_copy.dir_to_fdl(self.root)
+        self.assertNotIn("latin1.txt", fdl)
+        self.assertIn("$$FILE ok.txt\ncafé\n", fdl)
+        self.assertNotIn("�", fdl)
+
+
+if __name__ == "__main__":
+    unittest.main()
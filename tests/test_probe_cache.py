@@ -0,0 +1,53 @@
+import os
+import pickle
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tui_fdl_pro
+
+
+class ProbeCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = mock.patch.dict(os.environ, {'XDG_CACHE_HOME': self.tmp.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.root = os.path.join(self.tmp.name, 'project')
+        self.cache_path = tui_fdl_pro._probe_cache_path(self.root)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write_raw(self, data: bytes):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with open(self.cache_path, 'wb') as f:
+            f.write(data)
+
+    def test_round_trip(self):
+        cache = {'/p/a.txt': ((3, 42), True)}
+        tui_fdl_pro.save_probe_cache(self.root, cache)
+        self.assertEqual(tui_fdl_pro.load_probe_cache(self.root), cache)
+
+    def test_other_version_is_discarded(self):
+        stale = (tui_fdl_pro.PROBE_CACHE_VERSION - 1, {'/p/a.txt': ((3, 42), True)})
+        self._write_raw(pickle.dumps(stale))
+        self.assertEqual(tui_fdl_pro.load_probe_cache(self.root), {})
+
+    def test_unversioned_cache_is_discarded(self):
+        self._write_raw(pickle.dumps({'/p/a.txt': ((3, 42), True)}))
+        self.assertEqual(tui_fdl_pro.load_probe_cache(self.root), {})
+
+    def test_corrupt_or_truncated_cache_is_discarded(self):
+        data = pickle.dumps((tui_fdl_pro.PROBE_CACHE_VERSION, {'/p/a.txt': ((3, 42), True)}))
+        for raw in (b'', b'not a pickle', data[:len(data) // 2]):
+            with self.subTest(raw=raw[:16]):
+                self._write_raw(raw)
+                self.assertEqual(tui_fdl_pro.load_probe_cache(self.root), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,15 @@
+import io
 import os
 import sys
+import codecs
 import argparse
 import datetime
 import threading
+import re
 import fnmatch
 import difflib
-from typing import List, Dict, Optional, Tuple, Set
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterator, List, Dict, Optional, Tuple
 
 import blessed
 import pyperclip
@@ -14,19 +18,82 @@ import pyperclip
 DIFF_MARKER = "$$DIFF"
 ENCODING = 'utf-8'
 
+# 并发对比文件的线程数 (I/O 密集, 可以多于 CPU 核数)
+MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# 按状态排序时的先后顺序 (目录的 status 为 None)
+_STATUS_ORDER = {'modified': 0, 'added': 1, 'removed': 2, None: 3}
+# 预先生成的各层级缩进字符串, 绘制时按深度直接取用 (超出表长的极深层级才现场拼接)
+_INDENTS = tuple('  ' * d for d in range(256))
+# 探测文件类型时读取的字节数
+PROBE_SIZE = 4096
+# 读取文件剩余内容时每次 read 的字节数
+READ_CHUNK_SIZE = 1 << 16
+# Windows 下必须以二进制方式打开, 否则 os.read 会做换行转换
+_O_RDONLY_BINARY = os.O_RDONLY | getattr(os, 'O_BINARY', 0)
+# 已知的二进制扩展名: 命中时直接判定为非文本, 不必打开文件
+_BINARY_EXTS = frozenset({
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.ico',
+    '.zip', '.gz', '.bz2', '.xz', '.tar', '.7z', '.rar', '.jar',
+    '.pdf', '.mp3', '.mp4', '.mov', '.avi', '.wav', '.flac',
+    '.o', '.a', '.so', '.dll', '.exe', '.class', '.pyc', '.pyo',
+    '.woff', '.woff2', '.ttf', '.otf', '.bin', '.dat', '.db', '.sqlite',
+})
+
 # --- 辅助函数 ---
-def is_encodable(filepath: str) -> bool:
-    if not os.path.exists(filepath):
+def _is_utf8_bytes(buf: bytes) -> bool:
+    # 含 NUL 字节基本可断定是二进制 (memchr 级别的检查, 不必进入解码器)
+    if b'\x00' in buf:
         return False
+    # 读满探测块时增量解码 (final=False): 被截断在块末尾的多字节字符不算错误;
+    # 不足一个探测块说明已读到文件末尾, 此时按完整内容严格校验
     try:
-        with open(filepath, 'r', encoding=ENCODING) as f:
-            f.read(1024)
+        codecs.utf_8_decode(buf, 'strict', len(buf) < PROBE_SIZE)
         return True
-    except (UnicodeDecodeError, IOError):
+    except UnicodeDecodeError:
+        return False
+
+def is_encodable(filepath: str) -> bool:
+    if os.path.splitext(filepath)[1].lower() in _BINARY_EXTS:
+        return False
+    try:
+        fd = os.open(filepath, _O_RDONLY_BINARY)
+        try:
+            buf = os.read(fd, PROBE_SIZE)
+        finally:
+            os.close(fd)
+    except OSError:
         return False
+    return _is_utf8_bytes(buf)
 
-def get_file_lines(filepath: str) -> List[str]:
-    if not os.path.exists(filepath) or not is_encodable(filepath):
+def _read_text_bytes(filepath: str) -> Optional[bytes]:
+    # 探测与读取共用一次 open: 探测块本身就是内容开头, 不是文本文件或读取失败时返回 None
+    if os.path.splitext(filepath)[1].lower() in _BINARY_EXTS:
+        return None
+    try:
+        fd = os.open(filepath, _O_RDONLY_BINARY)
+        try:
+            head = os.read(fd, PROBE_SIZE)
+            if not _is_utf8_bytes(head):
+                return None
+            if len(head) < PROBE_SIZE:
+                return head
+            chunks = [head]
+            while chunk := os.read(fd, READ_CHUNK_SIZE):
+                chunks.append(chunk)
+            return b''.join(chunks)
+        finally:
+            os.close(fd)
+    except OSError:
+        return None
+
+def _split_text_lines(data: bytes) -> List[str]:
+    # 与以文本模式 (errors='ignore') 打开后 readlines 的结果一致, 包括通用换行符转换
+    return io.StringIO(data.decode(ENCODING, 'ignore'), newline=None).readlines()
+
+def get_file_lines(filepath: str, checked: bool = False) -> List[str]:
+    # checked=True 表示调用方已确认文件存在且可编码, 不再重复探测;
+    # 文件不存在时 is_encodable 的 os.open 本身就会失败, 无需先 exists 多一次 stat
+    if not checked and not is_encodable(filepath):
         return []
     try:
         with open(filepath, 'r', encoding=ENCODING, errors='ignore') as f:
@@ -34,6 +101,49 @@ def get_file_lines(filepath: str) -> List[str]:
     except IOError:
         return []
 
+def _scan_dir(path: Optional[str]) -> Dict[str, os.DirEntry]:
+    # 一次 scandir 取得 名称 -> DirEntry; 路径不存在或不是目录时返回空表
+    if not path:
+        return {}
+    try:
+        with os.scandir(path) as it:
+            return {entry.name: entry for entry in it}
+    except OSError:
+        return {}
+
+def _entry_is_dir(entry: os.DirEntry) -> bool:
+    # DirEntry 的类型来自 readdir 的 d_type, 仅符号链接等情况才需要 stat
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+def _entry_exists(entry: os.DirEntry) -> bool:
+    # 普通条目必然存在; 只有符号链接需要 stat 确认目标还在 (与 os.path.exists 一样, 失效链接视为不存在)
+    if not entry.is_symlink():
+        return True
+    try:
+        entry.stat()
+        return True
+    except OSError:
+        return False
+
+def compare_files(path1: Optional[str], path2: Optional[str]) -> Optional[str]:
+    # 返回差异状态 (modified/added/removed); 无差异或不是文本文件时返回 None
+    if path1 and path2:
+        # 检查是否都是可编码的文本文件，如果不是，我们在此版本中略过对比（或者可以标记为二进制差异）
+        # 每侧只打开一次; 字节完全相同时不必再解码分行
+        data1 = _read_text_bytes(path1)
+        data2 = _read_text_bytes(path2) if data1 is not None else None
+        if data1 is not None and data2 is not None and data1 != data2:
+            if _split_text_lines(data1) != _split_text_lines(data2):
+                return "modified"
+    elif path2:
+        if is_encodable(path2): return "added"
+    elif path1:
+        if is_encodable(path1): return "removed"
+    return None
+
 # --- 线程安全进度追踪器 ---
 class ProgressTracker:
     def __init__(self):
@@ -41,6 +151,7 @@ class ProgressTracker:
         self.total = 0
         self.current_path = ""
         self.lock = threading.Lock()
+        self.last_state: Tuple[int, int, str] = (0, 0, "")
 
     def update(self, count_increment, current_path=""):
         with self.lock:
@@ -48,13 +159,42 @@ class ProgressTracker:
             if current_path:
                 self.current_path = current_path
 
-    def set_total(self, total):
+    def add_total(self, total_increment):
+        # 边扫描边增长的总数: 单次遍历即可给出 "已完成/已发现" 进度
         with self.lock:
-            self.total = total
+            self.total += total_increment
 
     def get_state(self) -> Tuple[int, int, str]:
-        with self.lock:
-            return self.count, self.total, self.current_path
+        # 界面线程只尝试加锁: 扫描线程正持有锁时直接沿用上一次的快照, 绝不让生产者等待界面刷新
+        if not self.lock.acquire(blocking=False):
+            return self.last_state
+        try:
+            self.last_state = (self.count, self.total, self.current_path)
+        finally:
+            self.lock.release()
+        return self.last_state
+
+# --- 差异树节点 ---
+class Node:
+    # 使用 __slots__ 的定长节点: 比 dict 节省约 2/3 内存, 属性访问也更快
+    __slots__ = ('name', 'name_lower', 'rel_path', 'depth', 'type', 'status', 'selected', 'expanded',
+                 'diff_count', 'sel_count', 'parent', 'children', 'sorted_by')
+
+    def __init__(self, name: str, rel_path: str, depth: int, node_type: str, parent: Optional['Node'] = None):
+        self.name = name
+        self.name_lower = name.lower()
+        self.rel_path = rel_path
+        self.depth = depth
+        self.type = node_type # 'dir' 或 'file'
+        self.status: Optional[str] = None # 文件为 'added'/'removed'/'modified', 目录恒为 None
+        self.selected = True
+        self.expanded = False
+        # 子树中的差异文件数及其中当前已选中的数量 (文件节点恒为 1), 勾选时增量维护
+        self.diff_count = 1 if node_type == 'file' else 0
+        self.sel_count = self.diff_count
+        self.parent = parent
+        self.children: List['Node'] = []
+        self.sorted_by: Optional[str] = None # 子节点当前按哪种方式排序, None 表示尚未排序
 
 # --- TUI 核心应用类 ---
 class FdlDiffTuiApp:
@@ -63,13 +203,43 @@ class FdlDiffTuiApp:
         self.dir1 = os.path.abspath(dir1) # 旧版本 (Base)
         self.dir2 = os.path.abspath(dir2) # 新版本 (Target)
         self.exclude_patterns = exclude_patterns or []
+        # 所有排除规则合并编译为一个正则, 与 fnmatch.fnmatch 一样先做 normcase
+        self.exclude_re = (re.compile('|'.join(fnmatch.translate(os.path.normcase(p))
+                                               for p in self.exclude_patterns))
+                           if self.exclude_patterns else None)
         
         self.mode = 'loading'
         self.sort_by = 'name'
         self.last_drawn_lines = []
+        self.row_moves: List[str] = []
+        self.loading_drawn: Optional[tuple] = None # 上一帧加载界面对应的 (进度, 宽, 高)
+
+        # 浏览界面用到的样式转义序列只在启动时向 blessed 查询一次
+        self.esc_normal = str(self.term.normal)
+        self.esc_cursor = str(self.term.black_on_cyan)
+        self.esc_header = str(self.term.bold_white_on_royalblue)
+        self.esc_bar = str(self.term.bold_black_on_lightgray)
+        self.esc_message = str(self.term.bold_yellow)
+        self.esc_bold = str(self.term.bold)
+        self.esc_dim = str(self.term.dim)
+        self.esc_reverse = str(self.term.reverse)
+        # diff 预览的语法高亮: 新增 / 删除 / hunk 头
+        self.esc_added = str(self.term.green)
+        self.esc_removed = str(self.term.red)
+        self.esc_hunk = str(self.term.cyan)
+        self.sel_checked = f"{self.term.green}[✓]{self.esc_normal}"
+        self.status_tags = {
+            "added": f"{self.term.green} [+]{self.esc_normal}",
+            "removed": f"{self.term.red} [-]{self.esc_normal}",
+            "modified": f"{self.term.yellow} [M]{self.esc_normal}",
+        }
 
-        self.tree: Optional[Dict] = None
-        self.flat_list: List[Dict] = []
+        self.tree: Optional[Node] = None
+        self.flat_list: List[Node] = []
+        # 与 flat_list 平行的行数据 (缩进, 状态标记+名称, 可见宽度), 只随列表结构变化
+        self.flat_indents: List[str] = []
+        self.flat_tails: List[str] = []
+        self.flat_widths: List[int] = []
         self.cursor_pos = 0
         self.top_line = 0
         self.running = True
@@ -79,234 +249,313 @@ class FdlDiffTuiApp:
         self.total_diff_count = 0
 
         self.progress = ProgressTracker()
-        self.tree_result: Optional[Dict] = None
+        self.tree_result: Optional[Node] = None
         self.loader_thread = threading.Thread(target=self._build_tree_worker)
         self.loader_thread.daemon = True
         self.loader_thread.start()
 
         self.preview_content = []
         self.preview_scroll = 0
+        self.preview_page = 1
         self.preview_node = None
 
     def _build_tree_worker(self):
-        # 估算总数 (两个文件夹的文件总数之和的近似值)
-        total_files = sum(len(f) for _, _, f in os.walk(self.dir1)) + \
-                      sum(len(f) for _, _, f in os.walk(self.dir2))
-        self.progress.set_total(total_files // 2) # 粗略折半作为进度总量估算
-        
+        # 总数 (两侧目录的并集) 在 _build_diff_tree 扫描过程中逐步累加, 不再预先 os.walk 两棵树
         self.tree_result, self.total_diff_count = self._build_diff_tree("")
         if not self.tree_result:
             # 如果没有差异，创建一个空的根节点
-            self.tree_result = {"name": "No Differences Found", "rel_path": "", "depth": 0, "type": "dir", "expanded": True, "selected": False, "children": [], "diff_count": 0}
+            self.tree_result = Node("No Differences Found", "", 0, "dir")
+            self.tree_result.expanded = True
+            self.tree_result.selected = False
             self.total_diff_count = 0
             
         self.selected_count = self.total_diff_count
 
-    def _build_diff_tree(self, rel_path: str, depth: int = 0) -> Tuple[Optional[Dict], int]:
-        self.progress.update(1, current_path=rel_path if rel_path else "Root")
-        
+    def _build_diff_tree(self, rel_path: str) -> Tuple[Optional[Node], int]:
+        # 目录扫描交给线程池: 每个任务 scandir 两侧的同一目录并建好其中的节点, 子目录再作为新任务提交
+        # 每个目录只 scandir 一次, 类型与存在性都取自 DirEntry, 不再逐项 isdir/exists
+        name = os.path.basename(rel_path) if rel_path else "ROOT"
+        root = Node(name, rel_path, 0, "dir")
+        root.expanded = True
         abs1 = os.path.join(self.dir1, rel_path) if rel_path else self.dir1
         abs2 = os.path.join(self.dir2, rel_path) if rel_path else self.dir2
 
-        name = os.path.basename(rel_path) if rel_path else "ROOT"
-        node = {
-            "name": name, "rel_path": rel_path, "depth": depth, 
-            "selected": True, "children": [], "type": "dir", "expanded": depth == 0
-        }
-        
-        node_diff_count = 0
-
-        # 获取两个目录下的所有条目
-        entries1 = set(os.listdir(abs1)) if os.path.isdir(abs1) else set()
-        entries2 = set(os.listdir(abs2)) if os.path.isdir(abs2) else set()
-        all_entries = sorted(list(entries1.union(entries2)))
-
+        dir_nodes = [root]
+        # 文件对比 (探测 + 读取两侧内容) 是主要耗时, 同样交给线程池与目录扫描并行进行
+        compares = []
+        self.progress.add_total(1)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            pending = {executor.submit(self._scan_diff_dir, root, abs1, abs2)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    subdirs, files = future.result()
+                    for child, child_abs1, child_abs2 in subdirs:
+                        dir_nodes.append(child)
+                        pending.add(executor.submit(self._scan_diff_dir, child, child_abs1, child_abs2))
+                    for file_node, child_abs1, child_abs2 in files:
+                        compares.append((file_node, executor.submit(self._compare_worker, child_abs1, child_abs2, file_node.rel_path)))
+
+            for file_node, future in compares:
+                file_node.status = future.result()
+
+        # 子目录总是在父目录之后登记, 逆序遍历即可自底向上汇总差异数;
+        # 没有差异的文件和没有变化文件的子目录从树中裁剪掉
+        for node in reversed(dir_nodes):
+            children = [c for c in node.children if (c.status if c.type == "file" else c.children)]
+            node.children = children
+            node.diff_count = node.sel_count = sum(c.diff_count for c in children)
+
+        return root, root.diff_count
+
+    def _scan_diff_dir(self, node: Node, abs1: Optional[str], abs2: Optional[str]) -> Tuple[list, list]:
+        # 在工作线程中运行: 只写入本目录节点的 children, 返回 (待扫描的子目录, 待对比的文件), 均附带两侧绝对路径
+        rel_path = node.rel_path
+        depth = node.depth
+
+        # 获取两个目录下的所有条目 (一侧不是目录时为空)
+        entries1 = _scan_dir(abs1)
+        entries2 = _scan_dir(abs2)
+        # 此处不排序: 子节点在首次显示或导出时才按当前排序方式排序
+        all_entries = entries1.keys() | entries2.keys()
+        # --- 排除逻辑 ---
+        if depth == 0 and self.exclude_re:
+            all_entries = [name for name in all_entries
+                           if not self.exclude_re.match(os.path.normcase(name))]
+        # 新发现的条目计入总数, 完成时 count == total
+        self.progress.add_total(len(all_entries))
+
+        # 每个目录只拼一次带分隔符的前缀, 循环内用字符串拼接代替 os.path.join
+        rel_prefix = rel_path + os.sep if rel_path else ""
+        abs1_prefix = os.path.join(abs1, "") if abs1 else ""
+        abs2_prefix = os.path.join(abs2, "") if abs2 else ""
+
+        subdirs = []
+        files = []
         for entry_name in all_entries:
-            # --- 排除逻辑 ---
-            if depth == 0 and any(fnmatch.fnmatch(entry_name, p) for p in self.exclude_patterns):
-                continue
-
-            child_rel_path = os.path.join(rel_path, entry_name) if rel_path else entry_name
-            child_abs1 = os.path.join(self.dir1, child_rel_path)
-            child_abs2 = os.path.join(self.dir2, child_rel_path)
+            entry1 = entries1.get(entry_name)
+            entry2 = entries2.get(entry_name)
+            child_rel_path = rel_prefix + entry_name
+            child_abs1 = abs1_prefix + entry_name if entry1 is not None else None
+            child_abs2 = abs2_prefix + entry_name if entry2 is not None else None
 
-            is_dir1 = os.path.isdir(child_abs1)
-            is_dir2 = os.path.isdir(child_abs2)
+            is_dir1 = entry1 is not None and _entry_is_dir(entry1)
+            is_dir2 = entry2 is not None and _entry_is_dir(entry2)
 
-            # 如果在两边中任意一边是目录，则按目录处理（处理成目录意味着递归进去对比）
+            # 如果在两边中任意一边是目录，则按目录处理（处理成目录意味着进去对比）
             if is_dir1 or is_dir2:
-                child_node, child_count = self._build_diff_tree(child_rel_path, depth + 1)
-                if child_node is not None: # 如果子目录里面有差异，才添加到树中
-                    node["children"].append(child_node)
-                    node_diff_count += child_count
+                child_node = Node(entry_name, child_rel_path, depth + 1, "dir", node)
+                subdirs.append((child_node, child_abs1 if is_dir1 else None, child_abs2 if is_dir2 else None))
             else:
-                # 是文件
-                exists1 = os.path.exists(child_abs1)
-                exists2 = os.path.exists(child_abs2)
-                
-                status = None
-                if exists1 and exists2:
-                    # 检查是否都是可编码的文本文件，如果不是，我们在此版本中略过对比（或者可以标记为二进制差异）
-                    if is_encodable(child_abs1) and is_encodable(child_abs2):
-                        lines1 = get_file_lines(child_abs1)
-                        lines2 = get_file_lines(child_abs2)
-                        if lines1 != lines2:
-                            status = "modified"
-                elif exists2:
-                    if is_encodable(child_abs2): status = "added"
-                elif exists1:
-                    if is_encodable(child_abs1): status = "removed"
-
-                if status:
-                    file_node = {
-                        "name": entry_name, "rel_path": child_rel_path, "depth": depth + 1,
-                        "selected": True, "type": "file", "status": status, "children": []
-                    }
-                    node["children"].append(file_node)
-                    node_diff_count += 1
-
-        # 如果这个目录是空的（里面没有发生变化的文件），则将其从树中裁剪掉 (返回 None)
-        if depth > 0 and not node["children"]:
-            return None, 0
-
-        node['diff_count'] = node_diff_count
-        return node, node_diff_count
-
-    def _generate_diff_lines(self, rel_path: str) -> List[str]:
-        p1 = os.path.join(self.dir1, rel_path)
-        p2 = os.path.join(self.dir2, rel_path)
-        
-        lines1 = get_file_lines(p1)
-        lines2 = get_file_lines(p2)
+                # 是文件: 先按原顺序占位, 状态由线程池算出后再填入
+                # 失效的符号链接按该侧不存在处理, 另一侧的文件仍按新增/删除对比
+                if child_abs1 is not None and not _entry_exists(entry1): child_abs1 = None
+                if child_abs2 is not None and not _entry_exists(entry2): child_abs2 = None
+                child_node = Node(entry_name, child_rel_path, depth + 1, "file", node)
+                files.append((child_node, child_abs1, child_abs2))
+            node.children.append(child_node)
+        self.progress.update(1, current_path=rel_path if rel_path else "Root")
+        return subdirs, files
+
+    def _compare_worker(self, path1: Optional[str], path2: Optional[str], rel_path: str) -> Optional[str]:
+        # 在线程池中运行; ProgressTracker 自带锁, 可以直接更新
+        status = compare_files(path1, path2)
+        self.progress.update(1, current_path=rel_path)
+        return status
+
+    def _iter_diff_lines(self, node: Node) -> Iterator[str]:
+        rel_path = node.rel_path
+        status = node.status
+        # 节点状态在建树时已探测过存在性与可编码性: added 只有新文件, removed 只有旧文件
+        lines1 = [] if status == "added" else get_file_lines(os.path.join(self.dir1, rel_path), checked=True)
+        lines2 = [] if status == "removed" else get_file_lines(os.path.join(self.dir2, rel_path), checked=True)
         
-        diff = list(difflib.unified_diff(
+        diff = difflib.unified_diff(
             lines1, lines2,
             fromfile=f"a/{rel_path}", tofile=f"b/{rel_path}",
             n=3 # 上下文行数
-        ))
-        return [line.replace('\n', '') for line in diff]
+        )
+        # 按需逐行产出, 导出时不必先把整份 diff 收集成列表
+        for line in diff:
+            yield line.replace('\n', '')
 
-    def _toggle_selection(self, node: Dict, select_state: Optional[bool] = None):
-        target_state = select_state if select_state is not None else not node["selected"]
-        
-        delta_count = self._calculate_selection_delta(node, target_state)
+    def _generate_diff_lines(self, node: Node) -> List[str]:
+        return list(self._iter_diff_lines(node))
+
+    def _toggle_selection(self, node: Node, select_state: Optional[bool] = None):
+        target_state = select_state if select_state is not None else not node.selected
+        if node.selected == target_state: return
+
+        # 子树中已选中的差异数 (sel_count) 是增量维护的, 变化量可直接算出, 无需先遍历一遍
+        delta_count = (node.diff_count if target_state else 0) - node.sel_count
         self._apply_selection_state(node, target_state)
+
+        # 沿 parent 指针把变化量传回各级祖先
+        parent = node.parent
+        while parent is not None:
+            parent.sel_count += delta_count
+            parent = parent.parent
         self.selected_count += delta_count
 
-    def _calculate_selection_delta(self, node: Dict, target_state: bool) -> int:
-        if node['selected'] == target_state: return 0
-        if node['type'] == 'file':
-            return 1 if target_state else -1
-        
-        total_delta = 0
-        for child in node['children']:
-            total_delta += self._calculate_selection_delta(child, target_state)
-        return total_delta
-    
-    def _apply_selection_state(self, node: Dict, state: bool):
-        if node['selected'] != state:
-            node['selected'] = state
-            for child in node.get('children', []):
+    def _apply_selection_state(self, node: Node, state: bool):
+        node.selected = state
+        node.sel_count = node.diff_count if state else 0
+        # 只进入状态或汇总确实需要改变的子节点, 已经一致的子树整棵跳过
+        for child in node.children:
+            if child.selected != state or child.sel_count != (child.diff_count if state else 0):
                 self._apply_selection_state(child, state)
 
-    def _sort_children(self, node: Dict):
-        if node["type"] == 'dir' and node["children"]:
-            # 对于Diff模式，按 状态(增改删) 排序 或 名称排序
-            if self.sort_by == 'status':
-                status_order = {'modified': 0, 'added': 1, 'removed': 2, 'dir': 3}
-                key_func = lambda n: (status_order.get(n.get('status', 'dir'), 3), n['type'] == 'file', n['name'].lower())
-            else:
-                key_func = lambda n: (n['type'] == 'file', n['name'].lower())
-                
-            node["children"].sort(key=key_func)
-            for child in node["children"]: self._sort_children(child)
+    def _sort_children(self, node: Node):
+        # 惰性排序: 只处理当前节点, 且仅当它尚未按当前方式排过序时
+        if node.sorted_by == self.sort_by: return
+        # 对于Diff模式，按 状态(增改删) 排序 或 名称排序; 小写名称在建树时已算好
+        if self.sort_by == 'status':
+            node.children.sort(key=lambda n: (_STATUS_ORDER[n.status], n.type == 'file', n.name_lower))
+        else:
+            node.children.sort(key=lambda n: (n.type == 'file', n.name_lower))
+        node.sorted_by = self.sort_by
     
-    def _update_flat_list(self):
-        self.flat_list = []
-        def recurse(node: Dict):
-            if node["depth"] > 0 or node["name"] == "No Differences Found": # 隐藏根节点，除非它是空提示
-                self.flat_list.append(node)
-            if node.get("expanded", False) or node["depth"] == 0:
-                for child in node["children"]:
+    def _visible_descendants(self, node: Node) -> List[Node]:
+        # 按显示顺序列出 node 之下所有可见的子孙 (只进入已展开的目录)
+        rows = []
+        def recurse(node: Node):
+            self._sort_children(node)
+            for child in node.children:
+                rows.append(child)
+                if child.expanded:
                     recurse(child)
-        if self.tree: recurse(self.tree)
+        recurse(node)
+        return rows
+
+    def _row_parts(self, node: Node) -> Tuple[str, str, int]:
+        # 一行中不随勾选/光标变化的部分: (缩进, 状态标记+名称, 可见宽度)
+        icon = "▾" if node.expanded else "▸" if node.type == "dir" else " "
+        # 状态颜色标识 (可见宽度固定为 4 列)
+        status_tag = self.status_tags.get(node.status, "") if node.type == "file" else ""
+        display_name = f"{icon} {node.name}{'/' if node.type == 'dir' else ''}"
+        # 根据层级缩进 (depth - 1 因为我们隐藏了 Root)
+        level = max(0, node.depth - 1)
+        indent = _INDENTS[level] if level < len(_INDENTS) else '  ' * level
+        # 各部分可见宽度已知 (勾选框固定 3 列)
+        return indent, f"{status_tag} {display_name}", len(indent) + 3 + (4 if status_tag else 0) + 1 + len(display_name)
+
+    def _splice_rows(self, start: int, end: int, nodes: List[Node]):
+        # 用 nodes 替换 flat_list[start:end], 平行的行数据同步替换
+        parts = [self._row_parts(node) for node in nodes]
+        self.flat_list[start:end] = nodes
+        self.flat_indents[start:end] = [p[0] for p in parts]
+        self.flat_tails[start:end] = [p[1] for p in parts]
+        self.flat_widths[start:end] = [p[2] for p in parts]
+
+    def _update_flat_list(self):
+        # 全量重建: 只在加载完成和切换排序时需要, 展开/折叠走下面的增量拼接
+        self.flat_list, self.flat_indents, self.flat_tails, self.flat_widths = [], [], [], []
+        if self.tree:
+            # 隐藏根节点，除非它是空提示
+            nodes = [self.tree] if self.tree.name == "No Differences Found" else []
+            self._splice_rows(0, 0, nodes + self._visible_descendants(self.tree))
         if self.cursor_pos >= len(self.flat_list):
             self.cursor_pos = max(0, len(self.flat_list) - 1)
 
+    def _expand_node(self, pos: int):
+        node = self.flat_list[pos]
+        node.expanded = True
+        self._splice_rows(pos, pos + 1, [node] + self._visible_descendants(node))
+
+    def _collapse_node(self, pos: int):
+        node = self.flat_list[pos]
+        node.expanded = False
+        # 可见子孙在 flat_list 中紧跟在 node 之后, 且深度都大于 node
+        end = pos + 1
+        while end < len(self.flat_list) and self.flat_list[end].depth > node.depth:
+            end += 1
+        self._splice_rows(pos, end, [node])
+
     def _render(self, new_lines: List[str]):
-        for i in range(self.term.height):
+        drawn_lines = []
+        # 所有变化的行先拼进一个缓冲, 整帧只写一次 stdout
+        out = []
+        width, height = self.term.width, self.term.height
+        # 每行行首的光标定位序列只在终端高度变化时重新生成
+        if len(self.row_moves) != height:
+            self.row_moves = [self.term.move(i, 0) for i in range(height)]
+        row_moves = self.row_moves
+        for i in range(height):
             line = new_lines[i] if i < len(new_lines) else ""
-            line = line.ljust(self.term.width)
+            line = line.ljust(width)
             last_line = self.last_drawn_lines[i] if i < len(self.last_drawn_lines) else None
             if line != last_line:
-                print(self.term.move(i, 0) + line, end="")
-        self.last_drawn_lines = new_lines
-        sys.stdout.flush()
+                out.append(row_moves[i])
+                out.append(line)
+            drawn_lines.append(line)
+        # 保存补齐后的行, 下一帧才能与之逐行比较
+        self.last_drawn_lines = drawn_lines
+        if out:
+            sys.stdout.write("".join(out))
+            sys.stdout.flush()
 
     def _draw_loading_screen(self):
-        count, total, path = self.progress.get_state()
-        lines = [""] * self.term.height
+        state = self.progress.get_state()
+        width, height = self.term.width, self.term.height
+        # 进度和终端尺寸都没变时整帧跳过, 不必重新拼装和比较各行
+        if (state, width, height) == self.loading_drawn: return
+        self.loading_drawn = (state, width, height)
+        count, total, path = state
+        lines = [""] * height
         title = "Comparing directories..."
-        lines[self.term.height // 2 - 2] = self.term.center(self.term.bold(title))
+        lines[height // 2 - 2] = self.term.center(f"{self.esc_bold}{title}{self.esc_normal}", width)
         
         if total > 0:
             percentage = min(1.0, count / total) if total > 0 else 0
-            bar_width = self.term.width - 20
+            bar_width = width - 20
             filled_len = int(bar_width * percentage)
             bar = '█' * filled_len + '─' * (bar_width - filled_len)
             progress_bar = f"[{bar}] {percentage:.1%}"
-            lines[self.term.height // 2] = self.term.center(progress_bar)
+            lines[height // 2] = self.term.center(progress_bar, width)
+        else:
+            # 总数是边扫描边累加的, 尚未发现任何条目时只显示转动的指示符
+            lines[height // 2] = self.term.center("|/-\\"[count % 4], width)
+        # 总数会随扫描增长, 百分比可能回退, 额外给出单调递增的已扫描条目数
+        lines[height // 2 + 1] = self.term.center(f"{count} items scanned", width)
 
         display_path = path
-        if len(path) > self.term.width - 4:
-            display_path = "..." + path[-(self.term.width - 7):]
-        dimmed_path = f"{self.term.dim}{display_path}{self.term.normal}"
-        lines[self.term.height // 2 + 2] = self.term.center(dimmed_path)
+        if len(path) > width - 4:
+            display_path = "..." + path[-(width - 7):]
+        dimmed_path = f"{self.esc_dim}{display_path}{self.esc_normal}"
+        lines[height // 2 + 2] = self.term.center(dimmed_path, width)
         self._render(lines)
         
     def _draw_browse_mode(self):
         lines = []
-        height = self.term.height
+        # 终端尺寸每帧只读取一次 (每次访问都是一次 ioctl)
+        width, height = self.term.width, self.term.height
         sort_mode_str = f"Sort: {self.sort_by.capitalize()}"
         header1 = (f"FDL Diff | Selected Diffs: {self.selected_count} | "
                    f"Total Diffs: {self.total_diff_count} | {sort_mode_str}")
-        lines.append(self.term.bold_white_on_royalblue(header1.ljust(self.term.width)))
+        lines.append(f"{self.esc_header}{header1.ljust(width)}{self.esc_normal}")
         
         if self.cursor_pos < self.top_line: self.top_line = self.cursor_pos
         if self.cursor_pos >= self.top_line + height - 2: self.top_line = self.cursor_pos - height + 3
         
-        visible_items = self.flat_list[self.top_line : self.top_line + height - 2]
-        for i, node in enumerate(visible_items):
-            line_idx = self.top_line + i
-            sel_char = self.term.green("[✓]") if node.get("selected") else "[ ]"
-            
-            icon = "▾" if node.get("expanded") else "▸" if node["type"] == "dir" else " "
-            
-            # 状态颜色标识
-            status_tag = ""
-            if node["type"] == "file":
-                if node["status"] == "added": status_tag = self.term.green(" [+]")
-                elif node["status"] == "removed": status_tag = self.term.red(" [-]")
-                elif node["status"] == "modified": status_tag = self.term.yellow(" [M]")
-            
-            display_name = f"{icon} {node['name']}{'/' if node['type'] == 'dir' else ''}"
-            
-            # 根据层级缩进 (depth - 1 因为我们隐藏了 Root)
-            indent = max(0, node['depth'] - 1)
-            line_str = f"{'  ' * indent}{sel_char}{status_tag} {display_name}"
-            
-            line = line_str
+        flat_list, indents, tails, widths = self.flat_list, self.flat_indents, self.flat_tails, self.flat_widths
+        for line_idx in range(self.top_line, min(len(flat_list), self.top_line + height - 2)):
+            sel_char = self.sel_checked if flat_list[line_idx].selected else "[ ]"
+            # 可见宽度已知, 直接算出补齐空格;
+            # 对含转义序列的字符串做 ljust 会少补, 光标高亮条和上一帧残留都会出问题
+            line = f"{indents[line_idx]}{sel_char}{tails[line_idx]}{' ' * (width - widths[line_idx])}"
             if line_idx == self.cursor_pos:
-                line = self.term.black_on_cyan(line.ljust(self.term.width))
+                # 与 blessed 的包装方式一致: 内部每次恢复样式后重新打开高亮底色
+                line = f"{self.esc_cursor}{line.replace(self.esc_normal, self.esc_normal + self.esc_cursor)}{self.esc_normal}"
 
             lines.append(line)
 
         while len(lines) < height - 1: lines.append("")
         footer = "↑↓ Move | ←→ Expand/Collapse | Tab Sort | p Preview Diff | +/-/Spc Toggle | s Save | c Copy | q Quit"
         if self.message:
-            footer = self.term.bold_yellow(self.message.ljust(self.term.width))
+            # 消息样式结束后要恢复状态栏的样式
+            footer = f"{self.esc_message}{self.message.ljust(width)}{self.esc_normal}{self.esc_bar}"
             self.message = ""
-        lines.append(self.term.bold_black_on_lightgray(footer.ljust(self.term.width)))
+        lines.append(f"{self.esc_bar}{footer.ljust(width)}{self.esc_normal}")
         self._render(lines)
 
     def _draw_preview_mode(self):
@@ -314,13 +563,15 @@ class FdlDiffTuiApp:
         p_w, p_h = max(w - 10, 40), max(h - 6, 10)
         p_x, p_y = (w - p_w) // 2, (h - p_h) // 2
         content_h = p_h - 4
+        # 记下本帧可见的行数, 滚动按键直接使用, 不必再查询终端尺寸
+        self.preview_page = content_h
         lines = list(self.last_drawn_lines)
         lines[p_y] = self.term.move(p_y, p_x) + '╭' + '─' * (p_w - 2) + '╮'
         for i in range(p_h - 2): lines[p_y + 1 + i] = self.term.move(p_y + 1 + i, p_x) + '│' + ' ' * (p_w - 2) + '│'
         lines[p_y + p_h - 1] = self.term.move(p_y + p_h - 1, p_x) + '╰' + '─' * (p_w - 2) + '╯'
         
-        title = f" Diff: {self.preview_node['rel_path']} "
-        lines[p_y] = self.term.move(p_y, p_x + 1) + self.term.bold(title)
+        title = f" Diff: {self.preview_node.rel_path} "
+        lines[p_y] = self.term.move(p_y, p_x + 1) + f"{self.esc_bold}{title}{self.esc_normal}"
         
         for i in range(content_h):
             content_idx = self.preview_scroll + i
@@ -328,11 +579,11 @@ class FdlDiffTuiApp:
                 raw_text = self.preview_content[content_idx].replace('\t', '    ')[:p_w - 4]
                 # 对 diff 内容进行简单的语法高亮
                 if raw_text.startswith('+') and not raw_text.startswith('+++'):
-                    colored_text = self.term.green(raw_text)
+                    colored_text = f"{self.esc_added}{raw_text}{self.esc_normal}"
                 elif raw_text.startswith('-') and not raw_text.startswith('---'):
-                    colored_text = self.term.red(raw_text)
+                    colored_text = f"{self.esc_removed}{raw_text}{self.esc_normal}"
                 elif raw_text.startswith('@@'):
-                    colored_text = self.term.cyan(raw_text)
+                    colored_text = f"{self.esc_hunk}{raw_text}{self.esc_normal}"
                 else:
                     colored_text = raw_text
                 lines[p_y + 2 + i] = self.term.move(p_y + 2 + i, p_x + 2) + colored_text
@@ -340,7 +591,7 @@ class FdlDiffTuiApp:
         scroll_info = f"Ln {self.preview_scroll+1}/{max(1, len(self.preview_content))}"
         help_info = "[↑↓/PgUp/PgDn Scroll, p/q/Esc Close]"
         footer_text = f"{scroll_info.ljust(p_w - 2 - len(help_info))}{help_info}"
-        lines[p_y + p_h - 2] = self.term.move(p_y + p_h - 2, p_x + 1) + self.term.reverse(footer_text)
+        lines[p_y + p_h - 2] = self.term.move(p_y + p_h - 2, p_x + 1) + f"{self.esc_reverse}{footer_text}{self.esc_normal}"
         self._render(lines)
 
     def run(self):
@@ -353,10 +604,12 @@ class FdlDiffTuiApp:
                         self.mode = 'browse'
                         self._update_flat_list()
                         self.last_drawn_lines = []
+                        continue # 立即画出浏览界面, 而不是阻塞在下面的按键等待上
                 elif self.mode == 'browse': self._draw_browse_mode()
                 elif self.mode == 'preview': self._draw_preview_mode()
 
-                key = self.term.inkey(timeout=0.1)
+                # 只有加载界面需要定时刷新进度, 浏览和预览时阻塞等待按键
+                key = self.term.inkey(timeout=0.1 if self.mode == 'loading' else None)
                 if not key: continue
 
                 if key and self.mode == 'browse':
@@ -365,35 +618,35 @@ class FdlDiffTuiApp:
                     if key.code == self.term.KEY_UP: self.cursor_pos = max(0, self.cursor_pos - 1)
                     elif key.code == self.term.KEY_DOWN: self.cursor_pos = min(len(self.flat_list) - 1, self.cursor_pos + 1)
                     elif key.code == self.term.KEY_LEFT:
-                        if current_node["type"] == "dir" and current_node.get("expanded"):
-                            current_node["expanded"] = False; self._update_flat_list()
+                        if current_node.type == "dir" and current_node.expanded:
+                            self._collapse_node(self.cursor_pos)
                     elif key.code == self.term.KEY_RIGHT:
-                        if current_node["type"] == "dir" and not current_node.get("expanded"):
-                            current_node["expanded"] = True; self._update_flat_list()
+                        if current_node.type == "dir" and not current_node.expanded:
+                            self._expand_node(self.cursor_pos)
                     elif key in ('+', '='): self._toggle_selection(current_node, select_state=True)
                     elif key == '-': self._toggle_selection(current_node, select_state=False)
                     elif key == ' ': self._toggle_selection(current_node)
                     elif key.lower() == 'p':
-                        if current_node['type'] == 'file':
+                        if current_node.type == 'file':
                             self.mode = 'preview'; self.preview_node = current_node; self.preview_scroll = 0
-                            self.preview_content = self._generate_diff_lines(current_node['rel_path'])
+                            self.preview_content = self._generate_diff_lines(current_node)
                             if not self.preview_content:
                                 self.preview_content = ["(No textual difference or binary file)"]
                     elif key == '\t':
                         self.sort_by = 'status' if self.sort_by == 'name' else 'name'
-                        self._sort_children(self.tree); self._update_flat_list()
+                        # 只有可见的目录会立即重排, 其余目录在展开或导出时再排
+                        self._update_flat_list()
                         self.message = f"Sorted by {self.sort_by.capitalize()}"
                     elif key.lower() == 'c':
                         content = self._generate_fdl_string(); pyperclip.copy(content)
                         self.message = f"Copied diff to clipboard!"
                     elif key.lower() == 's':
-                        content = self._generate_fdl_string()
                         filename = f"fdl_diff_{datetime.datetime.now():%Y%m%d_%H%M%S}.diff"
-                        with open(filename, 'w', encoding=ENCODING) as f: f.write(content)
+                        with open(filename, 'w', encoding=ENCODING) as f: self._write_fdl(f)
                         self.message = f"Saved to {filename}!"
                     elif key.lower() == 'q': self.running = False
                 elif key and self.mode == 'preview':
-                    content_h = max(1, self.term.height - 10)
+                    content_h = self.preview_page
                     if key.code == self.term.KEY_UP: self.preview_scroll = max(0, self.preview_scroll-1)
                     elif key.code == self.term.KEY_DOWN: self.preview_scroll = min(max(0, len(self.preview_content)-content_h), self.preview_scroll+1)
                     elif key.code == self.term.KEY_PGUP: self.preview_scroll = max(0, self.preview_scroll - content_h)
@@ -409,20 +662,34 @@ class FdlDiffTuiApp:
                     if self.term.inkey().lower() == 'y': break
                     else: self.running = True; self.last_drawn_lines = []
 
-    def _generate_fdl_string(self) -> str:
-        fdl_parts = []
-        def recurse(node: Dict):
-            if node.get("selected", False):
-                if node["type"] == "file":
-                    diff_lines = self._generate_diff_lines(node["rel_path"])
-                    if diff_lines:
-                        fdl_parts.append(f"{DIFF_MARKER} {node['rel_path'].replace(os.sep, '/')}")
-                        fdl_parts.append("\n".join(diff_lines))
-                elif node["type"] == "dir":
-                    for child in node.get("children", []): 
+    def _write_fdl(self, fp):
+        # 逐个文件生成 diff 并直接写入 fp, 不在内存中累积全部片段再 join
+        first = True
+        def recurse(node: Node):
+            nonlocal first
+            if node.selected:
+                if node.type == "file":
+                    diff_lines = self._iter_diff_lines(node)
+                    first_line = next(diff_lines, None)
+                    if first_line is not None:
+                        if not first: fp.write("\n\n")
+                        first = False
+                        # 标记行与 diff 正文之间保留一个空行
+                        fp.write(f"{DIFF_MARKER} {node.rel_path.replace(os.sep, '/')}\n\n")
+                        fp.write(first_line)
+                        for line in diff_lines:
+                            fp.write("\n")
+                            fp.write(line)
+                elif node.type == "dir":
+                    self._sort_children(node)
+                    for child in node.children:
                         recurse(child)
         if self.tree: recurse(self.tree)
-        return "\n\n".join(fdl_parts)
+
+    def _generate_fdl_string(self) -> str:
+        buf = io.StringIO()
+        self._write_fdl(buf)
+        return buf.getvalue()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="TUI tool to generate diffs between two directories.")
@@ -1,10 +1,21 @@
+import io
 import os
+import mmap
 import sys
+import codecs
 import argparse
+import errno
 import datetime
+import shutil
+import subprocess
 import threading
+import re
 import fnmatch  # 新增导入
-from typing import List, Dict, Optional, Tuple
+import hashlib
+import pickle
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from operator import attrgetter
+from typing import Dict, List, Optional, Tuple, Set
 
 import blessed
 import pyperclip
@@ -13,15 +24,135 @@ import pyperclip
 FILE_MARKER = "$$FILE"
 ENCODING = 'utf-8'
 
+# 探测文件类型时读取的字节数
+PROBE_SIZE = 4096
+# Windows 下必须以二进制方式打开, 否则 os.read 会做换行转换
+_O_RDONLY_BINARY = os.O_RDONLY | getattr(os, 'O_BINARY', 0)
+# 已知的二进制扩展名: 命中时直接判定为非文本, 不必打开文件
+_BINARY_EXTS = frozenset({
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.ico',
+    '.zip', '.gz', '.bz2', '.xz', '.tar', '.7z', '.rar', '.jar',
+    '.pdf', '.mp3', '.mp4', '.mov', '.avi', '.wav', '.flac',
+    '.o', '.a', '.so', '.dll', '.exe', '.class', '.pyc', '.pyo',
+    '.woff', '.woff2', '.ttf', '.otf', '.bin', '.dat', '.db', '.sqlite',
+})
+# 保存 FDL 时每次拷贝的块大小
+COPY_CHUNK_SIZE = 1 << 20
+# 预览时建立行索引每次扫描的块大小
+PREVIEW_CHUNK_SIZE = 1 << 20
+
+# 并发扫描目录的线程数 (I/O 密集, 网络盘上延迟占主导, 可以多于 CPU 核数)
+MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# 探测缓存的格式版本: 修改 _BINARY_EXTS 或 _is_utf8_bytes 的判定规则时必须递增, 使旧缓存失效
+PROBE_CACHE_VERSION = 2
+# 预先生成的各层级缩进字符串, 绘制时按深度直接取用 (超出表长的极深层级才现场拼接)
+_INDENTS = tuple('  ' * d for d in range(256))
+
 # --- 辅助函数 ---
-def is_encodable(filepath: str) -> bool:
+def _is_utf8_bytes(buf: bytes) -> bool:
+    # 含 NUL 字节基本可断定是二进制 (memchr 级别的检查, 不必进入解码器)
+    if b'\x00' in buf:
+        return False
+    # 读满探测块时增量解码 (final=False): 被截断在块末尾的多字节字符不算错误;
+    # 不足一个探测块说明已读到文件末尾, 此时按完整内容严格校验
     try:
-        with open(filepath, 'r', encoding=ENCODING) as f:
-            f.read(1024)
+        codecs.utf_8_decode(buf, 'strict', len(buf) < PROBE_SIZE)
         return True
-    except (UnicodeDecodeError, IOError):
+    except UnicodeDecodeError:
+        return False
+
+def is_encodable(filepath: str) -> bool:
+    if os.path.splitext(filepath)[1].lower() in _BINARY_EXTS:
+        return False
+    try:
+        fd = os.open(filepath, _O_RDONLY_BINARY)
+        try:
+            buf = os.read(fd, PROBE_SIZE)
+        finally:
+            os.close(fd)
+    except OSError:
+        return False
+    return _is_utf8_bytes(buf)
+
+def _entry_is_dir(entry: os.DirEntry) -> bool:
+    # DirEntry 的类型来自 readdir 的 d_type, 仅符号链接等情况才需要 stat; stat 失败时按非目录处理
+    try:
+        return entry.is_dir()
+    except OSError:
         return False
 
+def _probe_cache_path(root_dir: str) -> str:
+    # 每个根目录一个缓存文件, 以根路径的哈希命名
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    digest = hashlib.sha1(root_dir.encode(ENCODING, 'surrogateescape')).hexdigest()[:16]
+    return os.path.join(cache_home, 'fdlpy', f"{digest}.pkl")
+
+def load_probe_cache(root_dir: str) -> Dict[str, Tuple[Tuple[int, int], bool]]:
+    # 上次运行的可编码性探测结果: 路径 -> ((大小, 修改时间), 是否可编码); 缓存缺失或损坏时从空表开始
+    # 缓存与写入时的版本号一起保存; 探测规则改变后版本号不同, 旧结果整体作废
+    try:
+        with open(_probe_cache_path(root_dir), 'rb') as f:
+            version, cache = pickle.load(f)
+    except (OSError, EOFError, ValueError, TypeError, AttributeError, ImportError, IndexError,
+            pickle.UnpicklingError):
+        return {}
+    return cache if version == PROBE_CACHE_VERSION and isinstance(cache, dict) else {}
+
+def save_probe_cache(root_dir: str, cache: Dict[str, Tuple[Tuple[int, int], bool]]):
+    # 先写临时文件再原子替换, 并发运行或中途退出都不会留下半个缓存文件; 写入失败时静默放弃
+    path = _probe_cache_path(root_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((PROBE_CACHE_VERSION, cache), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError:
+        try: os.remove(tmp_path)
+        except OSError: pass
+
+def copy_fd(src_fd: int, dst_fd: int):
+    # 优先用 copy_file_range 在内核内拷贝 (数据不经过 Python), 不支持时退回 read/write
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while os.copy_file_range(src_fd, dst_fd, COPY_CHUNK_SIZE):
+                pass
+            return
+        except OSError as e:
+            if e.errno not in (errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    while chunk := os.read(src_fd, COPY_CHUNK_SIZE):
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(dst_fd, view):]
+
+def _clipboard_command() -> Optional[List[str]]:
+    # 能直接从 stdin 接收 UTF-8 字节的剪切板命令; 找不到时返回 None
+    if sys.platform == 'darwin':
+        candidates = [['pbcopy']]
+    elif sys.platform.startswith('linux'):
+        candidates = [['xclip', '-selection', 'clipboard'], ['xsel', '-b', '-i']]
+        if os.environ.get('WAYLAND_DISPLAY'):
+            candidates.insert(0, ['wl-copy'])
+    else:
+        return None
+    for cmd in candidates:
+        if shutil.which(cmd[0]):
+            return cmd
+    return None
+
+def copy_bytes_to_clipboard(data: bytes):
+    # 已是 UTF-8 字节的内容直接写入剪切板命令的 stdin, 省去 解码成 str 再编码 的往返
+    cmd = _clipboard_command()
+    if cmd:
+        try:
+            subprocess.run(cmd, input=data, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            return
+        except (OSError, subprocess.CalledProcessError):
+            pass
+    # 其它平台 (如 Windows) 由 pyperclip 处理
+    pyperclip.copy(data.decode(ENCODING, errors='replace'))
+
 def format_size(size_bytes: int) -> str:
     if size_bytes < 1024:
         return f"{size_bytes} B"
@@ -37,6 +168,7 @@ class ProgressTracker:
         self.total = 0
         self.current_path = ""
         self.lock = threading.Lock()
+        self.last_state: Tuple[int, int, str] = (0, 0, "")
 
     def update(self, count_increment, current_path=""):
         with self.lock:
@@ -44,27 +176,144 @@ class ProgressTracker:
             if current_path:
                 self.current_path = current_path
 
-    def set_total(self, total):
+    def add_total(self, total_increment):
+        # 边扫描边增长的总数: 单次遍历即可给出 "已完成/已发现" 进度
         with self.lock:
-            self.total = total
+            self.total += total_increment
 
     def get_state(self) -> Tuple[int, int, str]:
-        with self.lock:
-            return self.count, self.total, self.current_path
+        # 界面线程只尝试加锁: 扫描线程正持有锁时直接沿用上一次的快照, 绝不让生产者等待界面刷新
+        if not self.lock.acquire(blocking=False):
+            return self.last_state
+        try:
+            self.last_state = (self.count, self.total, self.current_path)
+        finally:
+            self.lock.release()
+        return self.last_state
+
+# --- 树节点 ---
+class Node:
+    # 使用 __slots__ 的定长节点: 比 dict 节省约 2/3 内存, 属性访问也更快
+    __slots__ = ('name', 'name_lower', 'path', 'depth', 'type', 'size', 'selected', 'expanded',
+                 'encodable', 'encodable_count', 'encodable_size', 'sel_count', 'sel_size',
+                 'parent', 'children', 'sorted_by', 'row_cache')
+
+    def __init__(self, name: str, path: str, depth: int, node_type: str, parent: Optional['Node'] = None):
+        self.name = name
+        self.name_lower = name.lower()
+        self.path = path
+        self.depth = depth
+        self.type = node_type # 'dir' 或 'file'
+        self.size = 0
+        self.selected = True
+        self.expanded = False
+        self.encodable = True # 目录恒为 True, 文件为建树时的探测结果
+        self.encodable_count = 0
+        self.encodable_size = 0
+        # 子树中当前已选中的可编码文件数量/大小, 勾选时增量维护
+        self.sel_count = 0
+        self.sel_size = 0
+        self.parent = parent
+        self.children: List['Node'] = []
+        self.sorted_by: Optional[str] = None # 子节点当前按哪种方式排序, None 表示尚未排序
+        self.row_cache: Optional[tuple] = None # 浏览行中与勾选/展开/光标无关的部分, 见 _format_row
+
+# --- 预览用的惰性行视图 ---
+class LazyLines:
+    """
+    只记录每行起始偏移的只读行序列。文件以 mmap 只读映射, 后台线程按块扫描换行符建立索引,
+    取行时直接切片映射并解码, 打开大文件预览不再需要整体读入和 splitlines, 取行也没有 seek/read 系统调用。
+    """
+    def __init__(self, path: str):
+        self.line_starts = [0]
+        self.indexed = 0 # 已扫描到的字节偏移
+        self.complete = False
+        self.closed = False
+        with open(path, 'rb') as f:
+            self.size = os.fstat(f.fileno()).st_size
+            # 空文件无法映射; 映射建立后即可关闭文件对象
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        # 同步扫描第一块, 保证首屏可以立即显示; 剩余部分交给后台线程
+        if self._index_chunk():
+            threading.Thread(target=self._index_worker, daemon=True).start()
+
+    def _index_chunk(self) -> bool:
+        start = self.indexed
+        end = min(start + PREVIEW_CHUNK_SIZE, self.size)
+        mm = self.mm
+        i = mm.find(b'\n', start, end) if mm is not None else -1
+        while i != -1:
+            self.line_starts.append(i + 1)
+            i = mm.find(b'\n', i + 1, end)
+        self.indexed = end
+        if end >= self.size:
+            self.complete = True
+            return False
+        return True
+
+    def _index_worker(self):
+        try:
+            while not self.closed and self._index_chunk():
+                pass
+        except ValueError:
+            pass # 预览已关闭, 映射已释放
+
+    def __len__(self) -> int:
+        # 已确定结尾的行数; 扫描完成后, 若文件不以换行结尾则还有最后一行
+        count = len(self.line_starts) - 1
+        if self.complete and self.line_starts[-1] < self.size:
+            count += 1
+        return count
+
+    def __getitem__(self, index: int) -> str:
+        return self.head(index, None)
+
+    def head(self, index: int, max_bytes: Optional[int]) -> str:
+        # 只取一行的前 max_bytes 个字节: 超长行 (如压缩后的 JS) 只解码屏幕上放得下的部分
+        start = self.line_starts[index]
+        end = self.line_starts[index + 1] - 1 if index + 1 < len(self.line_starts) else self.size
+        if max_bytes is not None and end - start > max_bytes:
+            return self.mm[start:start + max_bytes].decode(ENCODING, errors='ignore')
+        return self.mm[start:end].rstrip(b'\r').decode(ENCODING, errors='ignore')
+
+    def close(self):
+        self.closed = True
+        if self.mm is not None:
+            self.mm.close()
 
 # --- TUI 核心应用类 ---
 class FdlTuiApp:
     def __init__(self, root_dir: str, exclude_patterns: Optional[List[str]] = None):
         self.term = blessed.Terminal()
+        # 预先取出绘制时用到的转义序列, 逐行绘制只做字符串拼接, 不再经过 blessed 的属性查找与调用
+        self.esc_normal = str(self.term.normal)
+        self.esc_dim = str(self.term.dim)
+        self.esc_green = str(self.term.green)
+        self.esc_cursor = str(self.term.black_on_green)
+        self.esc_bar = str(self.term.bold_black_on_lightgray)
+        self.esc_message = str(self.term.bold_yellow)
+        self.esc_bold = str(self.term.bold)
+        self.esc_reverse = str(self.term.reverse)
         self.root_dir = os.path.abspath(root_dir)
         self.exclude_patterns = exclude_patterns or [] # 新增
+        # 所有排除规则合并编译为一个正则, 与 fnmatch.fnmatch 一样先做 normcase
+        self.exclude_re = (re.compile('|'.join(fnmatch.translate(os.path.normcase(p))
+                                               for p in self.exclude_patterns))
+                           if self.exclude_patterns else None)
         
         self.mode = 'loading'
         self.sort_by = 'name'
         self.last_drawn_lines = []
-
-        self.tree: Optional[Dict] = None
-        self.flat_list: List[Dict] = []
+        self.row_moves: List[str] = []
+        self.loading_drawn: Optional[tuple] = None # 上一帧加载界面对应的 (进度, 宽, 高)
+        # 浏览模式的局部重绘状态: 缓存上一帧的列表行, 只重建发生变化的行
+        self.browse_rows: List[str] = []
+        self.browse_view: Tuple[int, int, int] = (-1, 0, 0) # (top_line, height, width)
+        self.dirty_rows: Set[int] = set()
+        self.full_redraw = True
+
+        self.tree: Optional[Node] = None
+        self.flat_list: List[Node] = []
         self.cursor_pos = 0
         self.top_line = 0
         self.running = True
@@ -76,202 +325,325 @@ class FdlTuiApp:
         self.total_encodable_count = 0
 
         self.progress = ProgressTracker()
-        self.tree_result: Optional[Dict] = None
+        self.tree_result: Optional[Node] = None
+        # 跨运行持久化的探测结果: probe_cache 为上次保存的内容, new_probe_cache 收集本次扫描到的文件
+        self.probe_cache: Dict[str, Tuple[Tuple[int, int], bool]] = {}
+        self.new_probe_cache: Dict[str, Tuple[Tuple[int, int], bool]] = {}
         self.loader_thread = threading.Thread(target=self._build_tree_worker)
         self.loader_thread.daemon = True
         self.loader_thread.start()
 
         self.preview_content = []
         self.preview_scroll = 0
+        self.preview_page = 1
         self.preview_node = None
 
     def _build_tree_worker(self):
-        # 估算总数 (可能会因排除而略有不准, 但不影响功能)
-        total_files = sum(len(files) for _, _, files in os.walk(self.root_dir))
-        self.progress.set_total(total_files)
-        
-        self.tree_result, self.total_encodable_count, self.total_encodable_size = self._build_tree(self.root_dir)
+        self.probe_cache = load_probe_cache(self.root_dir)
+        # 总数在 _build_tree 扫描过程中逐步累加, 不再预先 os.walk 整棵树
+        tree, count, size = self._build_tree(self.root_dir)
+        # 只保存本次扫描到的文件, 已删除文件的条目随之淘汰; 没有新增、变化或删除时不重写缓存文件
+        if self.new_probe_cache != self.probe_cache:
+            save_probe_cache(self.root_dir, self.new_probe_cache)
+        self.probe_cache = self.new_probe_cache = {}
+        self.tree_result, self.total_encodable_count, self.total_encodable_size = tree, count, size
         
         self.selected_count = self.total_encodable_count
         self.selected_size = self.total_encodable_size
 
-    def _build_tree(self, path: str, depth: int = 0) -> Tuple[Dict, int, int]:
-        self.progress.update(1, current_path=path)
-        name = os.path.basename(path)
-        node = {"name": name, "path": path, "depth": depth, "selected": True, "children": []}
-        
-        node_encodable_count = 0
-        node_encodable_size = 0
-
-        if os.path.isdir(path):
-            node["type"] = "dir"
-            node["expanded"] = False
-            try:
-                entries = sorted(os.scandir(path), key=lambda e: (e.is_file(), e.name.lower()))
-                for entry in entries:
-                    # --- 新增: 排除逻辑 ---
-                    # 仅在根目录(depth=0)的子节点上应用排除规则
-                    if depth == 0 and any(fnmatch.fnmatch(entry.name, p) for p in self.exclude_patterns):
-                        continue # 跳过此文件/文件夹
-
-                    child_node, child_count, child_size = self._build_tree(entry.path, depth + 1)
-                    node["children"].append(child_node)
-                    node_encodable_count += child_count
-                    node_encodable_size += child_size
-            except OSError:
-                pass
-            node["size"] = sum(c.get("size", 0) for c in node["children"])
-        else:
-            node["type"] = "file"
-            node["size"] = os.path.getsize(path) if os.path.exists(path) else 0
-            if is_encodable(path):
-                node_encodable_count = 1
-                node_encodable_size = node["size"]
+    def _build_tree(self, root_path: str) -> Tuple[Node, int, int]:
+        # 目录扫描交给线程池: 每个任务列出一个目录并建好其中的文件节点, 子目录再作为新任务提交
+        root = Node(os.path.basename(root_path), root_path, 0, "dir")
+        dir_nodes = [root]
+        self.progress.add_total(1)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            pending = {executor.submit(self._scan_dir_node, root)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for child in future.result():
+                        dir_nodes.append(child)
+                        pending.add(executor.submit(self._scan_dir_node, child))
+
+        # 子目录总是在父目录之后登记, 逆序遍历即可自底向上汇总
+        for node in reversed(dir_nodes):
+            children = node.children
+            node.size = sum(c.size for c in children)
+            node.encodable_count = sum(c.encodable_count for c in children)
+            node.encodable_size = sum(c.encodable_size for c in children)
+            node.sel_count = node.encodable_count
+            node.sel_size = node.encodable_size
+        return root, root.encodable_count, root.encodable_size
+
+    def _scan_dir_node(self, node: Node) -> List[Node]:
+        # 在工作线程中运行: 只写入本目录节点的 children, 返回待扫描的子目录节点
+        depth = node.depth + 1
+        try:
+            with os.scandir(node.path) as it:
+                # 此处不排序: 子节点在首次展开或导出时才按当前排序方式排序
+                entries = list(it)
+        except OSError:
+            self.progress.update(1, current_path=node.path)
+            return []
+
+        # --- 新增: 排除逻辑 ---
+        # 仅在根目录(depth=0)的子节点上应用排除规则
+        if depth == 1 and self.exclude_re:
+            entries = [entry for entry in entries
+                       if not self.exclude_re.match(os.path.normcase(entry.name))]
+        # 新发现的条目计入总数, 完成时 count == total
+        self.progress.add_total(len(entries))
+
+        subdirs = []
+        for entry in entries:
+            # DirEntry 的类型来自 readdir 的 d_type, 无需再 stat
+            if _entry_is_dir(entry):
+                child = Node(entry.name, entry.path, depth, "dir", node)
+                subdirs.append(child)
             else:
-                node["selected"] = False
-
-        node['encodable_count'] = node_encodable_count
-        node['encodable_size'] = node_encodable_size
-        return node, node_encodable_count, node_encodable_size
-
-    def _toggle_selection(self, node: Dict, select_state: Optional[bool] = None):
-        is_selectable = node["type"] == "dir" or is_encodable(node["path"])
-        if not is_selectable: return
-        target_state = select_state if select_state is not None else not node["selected"]
+                child = Node(entry.name, entry.path, depth, "file", node)
+                # 一次 DirEntry.stat() 取代 exists + getsize 两次 stat (Windows 上直接来自目录枚举结果)
+                try: st = entry.stat()
+                except OSError: st = None
+                # 可编码性只在建树时探测一次, 之后统一读取节点上的缓存;
+                # 大小和修改时间都没变的文件直接沿用上次运行的结果, 不必再打开文件
+                if st is None:
+                    child.encodable = is_encodable(entry.path)
+                else:
+                    child.size = st.st_size
+                    stamp = (st.st_size, st.st_mtime_ns)
+                    cached = self.probe_cache.get(entry.path)
+                    child.encodable = cached[1] if cached is not None and cached[0] == stamp else is_encodable(entry.path)
+                    # 各工作线程写入不同的键, 单次 dict 赋值在 GIL 下是原子的
+                    self.new_probe_cache[entry.path] = (stamp, child.encodable)
+                if child.encodable:
+                    child.encodable_count = child.sel_count = 1
+                    child.encodable_size = child.sel_size = child.size
+                else:
+                    child.selected = False
+            node.children.append(child)
+        # 进度按目录批量累加 (目录本身 + 其中的文件), 每个目录只加一次锁
+        self.progress.update(1 + len(entries) - len(subdirs), current_path=node.path)
+        return subdirs
+
+    def _toggle_selection(self, node: Node, select_state: Optional[bool] = None):
+        if not node.encodable: return
+        target_state = select_state if select_state is not None else not node.selected
         
-        delta_count, delta_size = self._calculate_selection_delta(node, target_state)
+        if node.selected == target_state: return
+
+        # 子树的选中汇总是增量维护的, 变化量可直接算出, 无需先遍历一遍
+        delta_count = (node.encodable_count if target_state else 0) - node.sel_count
+        delta_size = (node.encodable_size if target_state else 0) - node.sel_size
         self._apply_selection_state(node, target_state)
+        # 目录的勾选状态会传递给所有子孙, 可见的子孙行都可能改变
+        if node.type == "dir": self.full_redraw = True
+
+        # 沿 parent 指针把变化量传回各级祖先
+        parent = node.parent
+        while parent is not None:
+            parent.sel_count += delta_count
+            parent.sel_size += delta_size
+            parent = parent.parent
 
         self.selected_count += delta_count
         self.selected_size += delta_size
 
-    def _calculate_selection_delta(self, node: Dict, target_state: bool) -> Tuple[int, int]:
-        if node['selected'] == target_state: return 0, 0
-        is_selectable = node['type'] == 'dir' or is_encodable(node['path'])
-        if not is_selectable: return 0, 0
-
-        if node['type'] == 'file':
-            change = 1 if target_state else -1
-            return change, change * node['size']
-
-        total_delta_count, total_delta_size = 0, 0
-        for child in node['children']:
-            d_count, d_size = self._calculate_selection_delta(child, target_state)
-            total_delta_count += d_count
-            total_delta_size += d_size
-        return total_delta_count, total_delta_size
-    
-    def _apply_selection_state(self, node: Dict, state: bool):
-        is_selectable = node['type'] == 'dir' or is_encodable(node['path'])
-        if is_selectable and node['selected'] != state:
-            node['selected'] = state
-            for child in node.get('children', []):
+    def _apply_selection_state(self, node: Node, state: bool):
+        node.selected = state
+        node.sel_count = node.encodable_count if state else 0
+        node.sel_size = node.encodable_size if state else 0
+        # 只进入状态或汇总确实需要改变的子节点, 已经一致的子树整棵跳过
+        for child in node.children:
+            if child.encodable and (child.selected != state or child.sel_count != (child.encodable_count if state else 0)):
                 self._apply_selection_state(child, state)
 
-    def _sort_children(self, node: Dict):
-        if node["type"] == 'dir' and node["children"]:
-            key_func = (lambda n: (n['type'] == 'file', -n['size'], n['name'].lower())) if self.sort_by == 'size' else (lambda n: (n['type'] == 'file', n['name'].lower()))
-            node["children"].sort(key=key_func)
-            for child in node["children"]: self._sort_children(child)
+    def _sort_children(self, node: Node):
+        # 惰性排序: 只处理当前节点, 且仅当它尚未按当前方式排过序时
+        if node.sorted_by == self.sort_by: return
+        # 排序键使用建树时预先算好的 name_lower; 'dir' < 'file', 目录自然排在前面
+        if self.sort_by == 'size':
+            node.children.sort(key=lambda n: (n.type, -n.size, n.name_lower))
+        else:
+            node.children.sort(key=attrgetter('type', 'name_lower'))
+        node.sorted_by = self.sort_by
     
-    def _update_flat_list(self):
-        self.flat_list = []
-        def recurse(node: Dict):
-            self.flat_list.append(node)
-            if node.get("expanded", False):
-                for child in node["children"]:
+    def _visible_descendants(self, node: Node) -> List[Node]:
+        # 按显示顺序列出 node 之下所有可见的子孙 (只进入已展开的目录)
+        rows = []
+        def recurse(node: Node):
+            self._sort_children(node)
+            for child in node.children:
+                rows.append(child)
+                if child.expanded:
                     recurse(child)
-        if self.tree: recurse(self.tree)
+        if node.expanded: recurse(node)
+        return rows
+
+    def _update_flat_list(self):
+        # 全量重建: 只在加载完成和切换排序时需要, 展开/折叠走下面的增量拼接
+        self.flat_list = [self.tree] + self._visible_descendants(self.tree) if self.tree else []
         if self.cursor_pos >= len(self.flat_list):
             self.cursor_pos = max(0, len(self.flat_list) - 1)
+        self.full_redraw = True
+
+    def _expand_node(self, pos: int):
+        node = self.flat_list[pos]
+        node.expanded = True
+        self.flat_list[pos + 1:pos + 1] = self._visible_descendants(node)
+        self.full_redraw = True
+
+    def _collapse_node(self, pos: int):
+        node = self.flat_list[pos]
+        node.expanded = False
+        # 可见子孙在 flat_list 中紧跟在 node 之后, 且深度都大于 node
+        end = pos + 1
+        while end < len(self.flat_list) and self.flat_list[end].depth > node.depth:
+            end += 1
+        del self.flat_list[pos + 1:end]
+        self.full_redraw = True
 
     def _render(self, new_lines: List[str]):
-        for i in range(self.term.height):
+        drawn_lines = []
+        # 所有变化的行先拼进一个缓冲, 整帧只写一次 stdout
+        out = []
+        width, height = self.term.width, self.term.height
+        # 每行行首的光标定位序列只在终端高度变化时重新生成
+        if len(self.row_moves) != height:
+            self.row_moves = [self.term.move(i, 0) for i in range(height)]
+        row_moves = self.row_moves
+        for i in range(height):
             line = new_lines[i] if i < len(new_lines) else ""
-            line = line.ljust(self.term.width)
+            line = line.ljust(width)
             last_line = self.last_drawn_lines[i] if i < len(self.last_drawn_lines) else None
             if line != last_line:
-                print(self.term.move(i, 0) + line, end="")
-        self.last_drawn_lines = new_lines
-        sys.stdout.flush()
+                out.append(row_moves[i])
+                out.append(line)
+            drawn_lines.append(line)
+        # 保存补齐后的行, 下一帧才能与之逐行比较
+        self.last_drawn_lines = drawn_lines
+        if out:
+            sys.stdout.write("".join(out))
+            sys.stdout.flush()
 
     def _draw_loading_screen(self):
-        count, total, path = self.progress.get_state()
-        lines = [""] * self.term.height
+        state = self.progress.get_state()
+        width, height = self.term.width, self.term.height
+        # 进度和终端尺寸都没变时整帧跳过, 不必重新拼装和比较各行
+        if (state, width, height) == self.loading_drawn: return
+        self.loading_drawn = (state, width, height)
+        count, total, path = state
+        lines = [""] * height
         title = "Scanning project..."
-        lines[self.term.height // 2 - 2] = self.term.center(self.term.bold(title))
+        lines[height // 2 - 2] = self.term.center(f"{self.esc_bold}{title}{self.esc_normal}", width)
         
         if total > 0:
             percentage = min(1.0, count / total) if total > 0 else 0
-            bar_width = self.term.width - 20
+            bar_width = width - 20
             filled_len = int(bar_width * percentage)
             bar = '█' * filled_len + '─' * (bar_width - filled_len)
             progress_bar = f"[{bar}] {percentage:.1%}"
-            lines[self.term.height // 2] = self.term.center(progress_bar)
+            lines[height // 2] = self.term.center(progress_bar, width)
+        else:
+            # 总数是边扫描边累加的, 尚未发现任何条目时只显示转动的指示符
+            lines[height // 2] = self.term.center("|/-\\"[count % 4], width)
+        # 总数会随扫描增长, 百分比可能回退, 额外给出单调递增的已扫描条目数
+        lines[height // 2 + 1] = self.term.center(f"{count} items scanned", width)
 
         display_path = path
-        if len(path) > self.term.width - 4:
-            display_path = "..." + path[-(self.term.width - 7):]
-        dimmed_path = f"{self.term.dim}{display_path}{self.term.normal}"
-        lines[self.term.height // 2 + 2] = self.term.center(dimmed_path)
+        if len(path) > width - 4:
+            display_path = "..." + path[-(width - 7):]
+        dimmed_path = f"{self.esc_dim}{display_path}{self.esc_normal}"
+        lines[height // 2 + 2] = self.term.center(dimmed_path, width)
         self._render(lines)
         
     def _draw_browse_mode(self):
         lines = []
-        height = self.term.height
+        # 终端尺寸每帧只读取一次 (每次访问都是一次 ioctl)
+        width, height = self.term.width, self.term.height
         sort_mode_str = f"Sort: {self.sort_by.capitalize()}"
         header1 = (f"FDL Exporter | Selected: {format_size(self.selected_size)} ({self.selected_count}) | "
                    f"Total: {format_size(self.total_encodable_size)} ({self.total_encodable_count}) | {sort_mode_str}")
-        lines.append(self.term.bold_black_on_lightgray(header1.ljust(self.term.width)))
+        lines.append(f"{self.esc_bar}{header1.ljust(width)}{self.esc_normal}")
         
         if self.cursor_pos < self.top_line: self.top_line = self.cursor_pos
         if self.cursor_pos >= self.top_line + height - 2: self.top_line = self.cursor_pos - height + 3
         
-        visible_items = self.flat_list[self.top_line : self.top_line + height - 2]
-        for i, node in enumerate(visible_items):
-            line_idx = self.top_line + i
-            sel_char = f"{self.term.dim}[ ]{self.term.normal}" if node["type"] == "file" and not is_encodable(node["path"]) else (self.term.green("[✓]") if node["selected"] else "[ ]")
-            
-            # --- FIX: 交换展开/折叠图标 ---
-            icon = "▾" if node.get("expanded") else "▸" if node["type"] == "dir" else " "
-            
-            display_name = f"{icon} {node['name']}{'/' if node['type'] == 'dir' else ''}"
-            size_str = f"({format_size(node['size'])})" if node['size'] > 0 else ""
-            line_str = f"{'  ' * node['depth']}{sel_char} {display_name}"
-            
-            stripped_line_len = len(self.term.strip_seqs(line_str))
-            padding = self.term.width - stripped_line_len - len(size_str)
-            line = f"{line_str}{' ' * padding}{self.term.dim}{size_str}{self.term.normal}"
-            
-            lines.append(self.term.black_on_green(line) if line_idx == self.cursor_pos else line)
+        # 视口或终端尺寸变化、列表结构变化时整屏重建, 否则只重建脏行 (如光标移动前后的两行)
+        view = (self.top_line, height, width)
+        if self.full_redraw or view != self.browse_view:
+            visible_count = min(height - 2, len(self.flat_list) - self.top_line)
+            self.browse_rows = [self._format_row(self.top_line + i, width) for i in range(visible_count)]
+            self.browse_view = view
+            self.full_redraw = False
+        else:
+            for line_idx in self.dirty_rows:
+                row = line_idx - self.top_line
+                if 0 <= row < len(self.browse_rows):
+                    self.browse_rows[row] = self._format_row(line_idx, width)
+        self.dirty_rows.clear()
+        lines.extend(self.browse_rows)
 
         while len(lines) < height - 1: lines.append("")
         footer = "↑↓ Move | ←→ Expand/Collapse | Tab Sort | p Preview | +/-/Spc Toggle | s Save | c Copy | q Quit"
         if self.message:
-            footer = self.term.bold_yellow(self.message.ljust(self.term.width))
+            # 消息样式结束后要恢复状态栏的样式
+            footer = f"{self.esc_message}{self.message.ljust(width)}{self.esc_normal}{self.esc_bar}"
             self.message = ""
-        lines.append(self.term.bold_black_on_lightgray(footer.ljust(self.term.width)))
+        lines.append(f"{self.esc_bar}{footer.ljust(width)}{self.esc_normal}")
         self._render(lines)
 
+    def _format_row(self, line_idx: int, width: int) -> str:
+        node = self.flat_list[line_idx]
+        is_cursor = line_idx == self.cursor_pos
+        # 光标行中每次恢复样式后都要重新打开高亮底色
+        normal = self.esc_normal + self.esc_cursor if is_cursor else self.esc_normal
+        sel_char = f"{self.esc_dim}[ ]{normal}" if not node.encodable else (f"{self.esc_green}[✓]{normal}" if node.selected else "[ ]")
+
+        # --- FIX: 交换展开/折叠图标 ---
+        icon = "▾" if node.expanded else "▸" if node.type == "dir" else " "
+
+        # 缩进、名称、对齐空格和大小字符串在建树后不再变化, 只随终端宽度重建, 缓存在节点上
+        cache = node.row_cache
+        if cache is None or cache[0] != width:
+            name = f"{node.name}{'/' if node.type == 'dir' else ''}"
+            size_str = f"({format_size(node.size)})" if node.size > 0 else ""
+            indent = _INDENTS[node.depth] if node.depth < len(_INDENTS) else '  ' * node.depth
+            # 勾选框 "[✓]"/"[ ]" 和图标各占 1 个固定宽度, 可见长度直接算出
+            padding = width - (len(indent) + 6 + len(name)) - len(size_str)
+            cache = node.row_cache = (width, indent, f" {name}{' ' * padding}", size_str)
+        _, indent, tail, size_str = cache
+        line = f"{indent}{sel_char} {icon}{tail}{self.esc_dim}{size_str}{normal}"
+        
+        return f"{self.esc_cursor}{line}{self.esc_normal}" if is_cursor else line
+
     def _draw_preview_mode(self):
         w, h = self.term.width, self.term.height
         p_w, p_h = max(w - 10, 20), max(h - 6, 10)
         p_x, p_y = (w - p_w) // 2, (h - p_h) // 2
         content_h = p_h - 4
+        # 记下本帧可见的行数, 滚动按键直接使用, 不必再查询终端尺寸
+        self.preview_page = content_h
         lines = list(self.last_drawn_lines)
         lines[p_y] = self.term.move(p_y, p_x) + '╭' + '─' * (p_w - 2) + '╮'
         for i in range(p_h - 2): lines[p_y + 1 + i] = self.term.move(p_y + 1 + i, p_x) + '│' + ' ' * (p_w - 2) + '│'
         lines[p_y + p_h - 1] = self.term.move(p_y + p_h - 1, p_x) + '╰' + '─' * (p_w - 2) + '╯'
-        title = f" Preview: {os.path.basename(self.preview_node['path'])} ({format_size(self.preview_node['size'])}) "
-        lines[p_y] = self.term.move(p_y, p_x + 1) + self.term.bold(title)
+        title = f" Preview: {os.path.basename(self.preview_node.path)} ({format_size(self.preview_node.size)}) "
+        lines[p_y] = self.term.move(p_y, p_x + 1) + f"{self.esc_bold}{title}{self.esc_normal}"
+        lazy = isinstance(self.preview_content, LazyLines)
+        # 每个可见字符最多占 4 个 UTF-8 字节, 超出部分不必读取和解码
+        max_bytes = (p_w - 4) * 4
         for i in range(content_h):
             content_idx = self.preview_scroll + i
             if content_idx < len(self.preview_content):
-                lines[p_y + 2 + i] = self.term.move(p_y + 2 + i, p_x + 2) + self.preview_content[content_idx].replace('\t', '    ')[:p_w - 4]
-        scroll_info = f"Ln {self.preview_scroll+1}/{len(self.preview_content)}"
+                text = self.preview_content.head(content_idx, max_bytes) if lazy else self.preview_content[content_idx]
+                lines[p_y + 2 + i] = self.term.move(p_y + 2 + i, p_x + 2) + text.replace('\t', '    ')[:p_w - 4]
+        # 行索引仍在后台建立时, 总行数后面显示 "+"
+        indexing = lazy and not self.preview_content.complete
+        scroll_info = f"Ln {self.preview_scroll+1}/{len(self.preview_content)}{'+' if indexing else ''}"
         help_info = "[↑↓ Scroll, p/q/Esc Close]"
         footer_text = f"{scroll_info.ljust(p_w - 2 - len(help_info))}{help_info}"
-        lines[p_y + p_h - 2] = self.term.move(p_y + p_h - 2, p_x + 1) + self.term.reverse(footer_text)
+        lines[p_y + p_h - 2] = self.term.move(p_y + p_h - 2, p_x + 1) + f"{self.esc_reverse}{footer_text}{self.esc_normal}"
         self._render(lines)
 
     def run(self):
@@ -284,47 +656,52 @@ class FdlTuiApp:
                         self.mode = 'browse'
                         self._update_flat_list()
                         self.last_drawn_lines = []
+                        continue # 立即画出浏览界面, 而不是阻塞在下面的按键等待上
                 elif self.mode == 'browse': self._draw_browse_mode()
                 elif self.mode == 'preview': self._draw_preview_mode()
 
-                key = self.term.inkey(timeout=0.1)
+                # 只有加载进度和后台建立预览索引时需要定时重绘, 其余情况阻塞等待按键
+                polling = self.mode == 'loading' or (
+                    isinstance(self.preview_content, LazyLines) and not self.preview_content.complete)
+                key = self.term.inkey(timeout=0.1 if polling else None)
                 if not key: continue
 
                 if key and self.mode == 'browse':
                     if not self.flat_list: continue
                     current_node = self.flat_list[self.cursor_pos]
+                    # 光标所在行 (移动前后) 总是需要重绘
+                    self.dirty_rows.add(self.cursor_pos)
                     if key.code == self.term.KEY_UP: self.cursor_pos = max(0, self.cursor_pos - 1)
                     elif key.code == self.term.KEY_DOWN: self.cursor_pos = min(len(self.flat_list) - 1, self.cursor_pos + 1)
                     elif key.code == self.term.KEY_LEFT:
-                        if current_node["type"] == "dir" and current_node["expanded"]:
-                            current_node["expanded"] = False; self._update_flat_list()
+                        if current_node.type == "dir" and current_node.expanded:
+                            self._collapse_node(self.cursor_pos)
                     elif key.code == self.term.KEY_RIGHT:
-                        if current_node["type"] == "dir" and not current_node["expanded"]:
-                            current_node["expanded"] = True; self._update_flat_list()
+                        if current_node.type == "dir" and not current_node.expanded:
+                            self._expand_node(self.cursor_pos)
                     elif key in ('+', '='): self._toggle_selection(current_node, select_state=True)
                     elif key == '-': self._toggle_selection(current_node, select_state=False)
                     elif key == ' ': self._toggle_selection(current_node)
                     elif key.lower() == 'p':
-                        if current_node['type'] == 'file' and is_encodable(current_node['path']):
+                        if current_node.type == 'file' and current_node.encodable:
                             self.mode = 'preview'; self.preview_node = current_node; self.preview_scroll = 0
-                            try:
-                                with open(current_node['path'], 'r', encoding=ENCODING, errors='ignore') as f: self.preview_content = f.read().splitlines()
-                            except IOError: self.preview_content = ["Error reading file."]
+                            try: self.preview_content = LazyLines(current_node.path)
+                            except OSError: self.preview_content = ["Error reading file."]
                     elif key == '\t':
                         self.sort_by = 'size' if self.sort_by == 'name' else 'name'
-                        self._sort_children(self.tree); self._update_flat_list()
+                        self._update_flat_list()
                         self.message = f"Sorted by {self.sort_by.capitalize()}"
                     elif key.lower() == 'c':
-                        content = self._generate_fdl_string(); pyperclip.copy(content)
-                        self.message = f"Copied {format_size(len(content.encode(ENCODING)))} to clipboard!"
+                        content = self._generate_fdl_bytes(); copy_bytes_to_clipboard(content)
+                        self.message = f"Copied {format_size(len(content))} to clipboard!"
                     elif key.lower() == 's':
-                        content = self._generate_fdl_string()
                         filename = f"fdl_output_{datetime.datetime.now():%Y%m%d_%H%M%S}.txt"
-                        with open(filename, 'w', encoding=ENCODING) as f: f.write(content)
+                        self._save_fdl(filename)
                         self.message = f"Saved to {filename}!"
                     elif key.lower() == 'q': self.running = False
+                    self.dirty_rows.add(self.cursor_pos)
                 elif key and self.mode == 'preview':
-                    content_h = max(1, self.term.height - 10)
+                    content_h = self.preview_page
                     if key.code == self.term.KEY_UP: self.preview_scroll = max(0, self.preview_scroll-1)
                     elif key.code == self.term.KEY_DOWN: self.preview_scroll = min(max(0, len(self.preview_content)-content_h), self.preview_scroll+1)
                     elif key.code == self.term.KEY_PGUP: self.preview_scroll = max(0, self.preview_scroll - content_h)
@@ -333,6 +710,8 @@ class FdlTuiApp:
                     elif key.code == self.term.KEY_END: self.preview_scroll = max(0, len(self.preview_content)-content_h)
                     elif key.lower() in ('p', 'q') or key.code == self.term.KEY_ESCAPE:
                         self.mode = 'browse'; self.last_drawn_lines = []
+                        if isinstance(self.preview_content, LazyLines): self.preview_content.close()
+                        self.preview_content = []
 
                 if not self.running:
                     prompt = self.term.move(self.term.height - 1, 0) + self.term.bold_red("Are you sure you want to quit? [y/N] ".ljust(self.term.width))
@@ -340,21 +719,54 @@ class FdlTuiApp:
                     if self.term.inkey().lower() == 'y': break
                     else: self.running = True; self.last_drawn_lines = []
 
-    def _generate_fdl_string(self) -> str:
-        fdl_parts = []
-        def recurse(node: Dict):
-            if node.get("selected", False):
-                if node["type"] == "file":
-                    if is_encodable(node["path"]):
-                        relative_path = os.path.relpath(node["path"], self.root_dir).replace(os.sep, '/')
-                        fdl_parts.append(f"{FILE_MARKER} {relative_path}")
-                        try:
-                            with open(node["path"], 'r', encoding=ENCODING) as f: fdl_parts.append(f.read())
-                        except Exception: fdl_parts.append(f"ERROR: Could not read file {relative_path}")
-                elif node["type"] == "dir":
-                    for child in node["children"]: recurse(child)
-        if self.tree: recurse(self.tree)
-        return "\n".join(fdl_parts)
+    def _iter_export_files(self):
+        # 按树的显示顺序产出所有选中的可编码文件: (绝对路径, FDL 中的相对路径)
+        # 节点路径都由 scandir 在 root_dir 下逐级拼出, 切掉前缀即得相对路径, 不必逐个 relpath
+        prefix_len = len(os.path.join(self.root_dir, ""))
+        def recurse(node: Node):
+            if node.selected:
+                if node.type == "file":
+                    if node.encodable:
+                        yield node.path, node.path[prefix_len:].replace(os.sep, '/')
+                elif node.type == "dir":
+                    self._sort_children(node)
+                    for child in node.children: yield from recurse(child)
+        if self.tree: yield from recurse(self.tree)
+
+    def _generate_fdl_bytes(self) -> bytes:
+        # 以字节流拼接 FDL, 文件内容原样拷贝, 不做解码/再编码
+        buf = io.BytesIO()
+        for path, relative_path in self._iter_export_files():
+            if buf.tell(): buf.write(b"\n")
+            buf.write(f"{FILE_MARKER} {relative_path}\n".encode(ENCODING, 'surrogateescape'))
+            # 选中的大多是小文件, 直接用原始 fd 读取: 省去每个文件的缓冲文件对象和额外的 fstat/lseek
+            try:
+                fd = os.open(path, _O_RDONLY_BINARY)
+                try:
+                    while chunk := os.read(fd, COPY_CHUNK_SIZE): buf.write(chunk)
+                finally: os.close(fd)
+            except OSError: buf.write(f"ERROR: Could not read file {relative_path}".encode(ENCODING, 'surrogateescape'))
+        return buf.getvalue()
+
+    def _save_fdl(self, filename: str):
+        # 直接写入目标文件: 只有标记行经过 Python, 文件内容由内核拷贝
+        dst = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            first = True
+            for path, relative_path in self._iter_export_files():
+                header = f"{FILE_MARKER} {relative_path}\n" if first else f"\n{FILE_MARKER} {relative_path}\n"
+                os.write(dst, header.encode(ENCODING, 'surrogateescape'))
+                first = False
+                # 打开或拷贝途中读取失败 (例如扫描后被换成了目录) 时与 _generate_fdl_bytes 一样写入错误行;
+                # 目标文件本身写不进去时, 写错误行同样会失败并把异常抛出
+                try:
+                    src = os.open(path, _O_RDONLY_BINARY)
+                    try: copy_fd(src, dst)
+                    finally: os.close(src)
+                except OSError:
+                    os.write(dst, f"ERROR: Could not read file {relative_path}".encode(ENCODING, 'surrogateescape'))
+        finally:
+            os.close(dst)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="TUI tool to pack file contents.")